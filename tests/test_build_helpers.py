@@ -0,0 +1,236 @@
+"""Unit tests for the helpers in scripts/build_extension.py."""
+import errno
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT / "scripts"))
+import build_extension  # noqa: E402
+
+
+@pytest.fixture
+def fake_repo(tmp_path, monkeypatch):
+    root = tmp_path.resolve() / "repo"
+    for rel in [
+        "ui-agent-bridge.js",
+        "side-panel/assets/a.js",
+        "side-panel/assets/a.css",
+        "side-panel/assets/sub/b.js",
+        "options/assets/c.js",
+        "other/d.js",
+    ]:
+        p = root / rel
+        p.parent.mkdir(parents=True, exist_ok=True)
+        p.write_text("x", encoding="utf-8")
+    (tmp_path / "outside.js").write_text("x", encoding="utf-8")
+    monkeypatch.setattr(build_extension, "REPO_ROOT", root)
+    monkeypatch.setattr(build_extension, "REPO_ROOT_PREFIX", str(root) + build_extension.os.sep)
+    return root
+
+
+def full(patterns):
+    manifest = {"web_accessible_resources": [{"resources": patterns}]}
+    return build_extension.collect_full_resources(manifest, set())
+
+
+@pytest.mark.parametrize(
+    "pattern,expected",
+    [
+        ("side-panel/assets/*.js", ("side-panel/assets", "*.js")),
+        ("*.js", ("", "*.js")),
+        ("a/b?/c.js", ("a", "b?/c.js")),
+        ("a/[bc]/*.js", ("a", "[bc]/*.js")),
+        ("ui-agent-bridge.js", ("ui-agent-bridge.js", "")),
+        ("a/b/c.js", ("a/b/c.js", "")),
+    ],
+)
+def test_split_glob_prefix(pattern, expected):
+    assert build_extension.split_glob_prefix(pattern) == expected
+
+
+def test_full_anchored_glob_matches_under_prefix_only(fake_repo):
+    assert full(["side-panel/assets/*.css"]) == {"side-panel/assets/a.css"}
+
+
+def test_full_glob_star_crosses_directories(fake_repo):
+    # fnmatch's * matches "/", so nested files under the prefix are included.
+    assert full(["side-panel/assets/*.js"]) == {
+        "side-panel/assets/a.js",
+        "side-panel/assets/sub/b.js",
+    }
+
+
+def test_full_unanchored_glob_walks_whole_repo(fake_repo):
+    assert full(["*.js"]) == {
+        "ui-agent-bridge.js",
+        "side-panel/assets/a.js",
+        "side-panel/assets/sub/b.js",
+        "options/assets/c.js",
+        "other/d.js",
+    }
+
+
+def test_full_literal_paths(fake_repo):
+    assert full(["ui-agent-bridge.js", "missing.js", "./other/../other/d.js"]) == {
+        "ui-agent-bridge.js",
+        "other/d.js",
+    }
+
+
+def test_full_keeps_minimal_resources(fake_repo):
+    manifest = {"web_accessible_resources": [{"resources": ["options/assets/*.js"]}]}
+    result = build_extension.collect_full_resources(manifest, {"background.iife.js"})
+    assert result == {"background.iife.js", "options/assets/c.js"}
+
+
+@pytest.mark.parametrize("pattern", ["../outside.js", "../*.js", "/etc/passwd", "/tmp/*.js", "a/../../*.js"])
+def test_full_ignores_entries_outside_repo(fake_repo, pattern):
+    assert full([pattern]) == set()
+
+
+def test_full_ignores_symlink_escaping_repo(fake_repo, tmp_path):
+    link = fake_repo / "linked"
+    try:
+        link.symlink_to(tmp_path, target_is_directory=True)
+    except OSError:
+        pytest.skip("symlinks not supported")
+    assert full(["linked/*.js", "linked/outside.js"]) == set()
+
+
+def attr_values(html: bytes):
+    return list(build_extension.iter_html_attr_values(html))
+
+
+def test_attr_scan_basic_and_case_insensitive():
+    html = b'<script SRC="a.js"></script><link Href=\'b.css\'><img src="c.png">'
+    assert attr_values(html) == ["a.js", "b.css", "c.png"]
+
+
+def test_attr_scan_whitespace_around_equals():
+    assert attr_values(b'<script src = "a.js"><link href\n=\t\'b.css\'>') == ["a.js", "b.css"]
+
+
+def test_attr_scan_substring_attribute_names():
+    # Like the old regex, no word boundary is required, so data-src="..." matches;
+    # srcset does not, because "src" must be followed by "=".
+    assert attr_values(b'<img data-src="a.png" srcset="b.png 2x" src="c.png">') == ["a.png", "c.png"]
+
+
+def test_attr_scan_skips_empty_and_unquoted_values():
+    assert attr_values(b'<img src=""><img src=bare.png><a href=\'\'></a><img src="ok.png">') == ["ok.png"]
+
+
+def test_attr_scan_unterminated_quote():
+    assert attr_values(b'<img src="ok.png"><img src="never-closed') == ["ok.png"]
+    assert attr_values(b"src") == []
+    assert attr_values(b"src=") == []
+
+
+def test_attr_scan_value_ends_at_matching_quote():
+    # Documented difference from the old regex, which stopped at the first quote
+    # of either kind ("a" here).
+    assert attr_values(b"<img src=\"a'b.png\"><img src='c\"d.png'>") == ["a'b.png", 'c"d.png']
+
+
+def test_extract_html_asset_refs(fake_repo):
+    html = fake_repo / "side-panel" / "index.html"
+    html.write_text(
+        '<script src="./assets/a.js"></script>'
+        '<link href="assets/a.css">'
+        '<script src="../ui-agent-bridge.js"></script>'
+        '<script src="https://cdn.example/x.js"></script>'
+        '<img src="data:image/png;base64,AAAA">'
+        '<script src="../../outside.js"></script>'
+        '<script src="assets/missing.js"></script>',
+        encoding="utf-8",
+    )
+    assert list(build_extension.extract_html_asset_refs(html)) == [
+        "side-panel/assets/a.js",
+        "side-panel/assets/a.css",
+        "ui-agent-bridge.js",
+        "side-panel/assets/missing.js",
+    ]
+
+
+def test_fast_copy_refuses_same_file(tmp_path):
+    victim = tmp_path / "victim.txt"
+    victim.write_bytes(b"hello\n")
+    with pytest.raises(shutil.SameFileError):
+        build_extension._fast_copy(victim, victim)
+    assert victim.read_bytes() == b"hello\n"
+
+
+def test_fast_copy_preserves_content_and_mtime(tmp_path):
+    src = tmp_path / "src.bin"
+    src.write_bytes(bytes(range(256)) * 4096)
+    build_extension.os.utime(src, ns=(1_000_000_000, 1_000_000_000))
+    dest = tmp_path / "dest.bin"
+    build_extension._fast_copy(src, dest)
+    assert dest.read_bytes() == src.read_bytes()
+    assert dest.stat().st_mtime_ns == src.stat().st_mtime_ns
+
+
+def copy_file_range_returns_zero(*args):
+    return 0
+
+
+def copy_file_range_cross_device(*args):
+    raise OSError(errno.EXDEV, "cross-device")
+
+
+@pytest.mark.parametrize("fake", [copy_file_range_returns_zero, copy_file_range_cross_device])
+def test_fast_copy_falls_back_when_copy_file_range_does_not_apply(tmp_path, monkeypatch, fake):
+    src = tmp_path / "src.txt"
+    src.write_bytes(b"payload")
+    dest = tmp_path / "dest.txt"
+    monkeypatch.setattr(build_extension.os, "copy_file_range", fake, raising=False)
+    build_extension._fast_copy(src, dest)
+    assert dest.read_bytes() == b"payload"
+
+
+def test_fast_copy_does_not_mask_real_errors(tmp_path, monkeypatch):
+    src = tmp_path / "src.txt"
+    src.write_bytes(b"payload")
+
+    def bad_fd(*a):
+        raise OSError(errno.EBADF, "bad fd")
+
+    monkeypatch.setattr(build_extension.os, "copy_file_range", bad_fd, raising=False)
+    with pytest.raises(OSError):
+        build_extension._fast_copy(src, tmp_path / "dest.txt")
+
+
+def test_walk_files_skips_old_output_dirs(tmp_path):
+    (tmp_path / "keep").mkdir()
+    (tmp_path / "keep" / "a.js").write_text("x", encoding="utf-8")
+    (tmp_path / "out.old.0123abcd").mkdir()
+    (tmp_path / "out.old.0123abcd" / "b.js").write_text("x", encoding="utf-8")
+    found = {Path(p).name for p in build_extension._walk_files(tmp_path)}
+    assert found == {"a.js"}
+
+
+def test_remove_tree_async_logs_failed_delete(tmp_path, monkeypatch, capsys):
+    out = tmp_path / "out"
+    out.mkdir()
+
+    def failing_rmtree(path):
+        raise OSError(errno.EACCES, "denied")
+
+    monkeypatch.setattr(build_extension.shutil, "rmtree", failing_rmtree)
+    threads = []
+    real_thread = build_extension.threading.Thread
+
+    def recording_thread(*args, **kwargs):
+        t = real_thread(*args, **kwargs)
+        threads.append(t)
+        return t
+
+    monkeypatch.setattr(build_extension.threading, "Thread", recording_thread)
+    build_extension.remove_tree_async(out)
+    for t in threads:
+        t.join()
+    assert not out.exists()
+    assert "[warn] Could not remove old output dir" in capsys.readouterr().out
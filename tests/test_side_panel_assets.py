@@ -7,37 +7,43 @@ Assumptions:
  - build script should fail fast if referenced assets missing (exit code 1), so here we only check presence post-build.
 """
 from __future__ import annotations
-import subprocess
+import os
+import re
 import sys
 from pathlib import Path
 
 REPO_ROOT = Path(__file__).resolve().parent.parent
-SCRIPT = REPO_ROOT / "scripts" / "build_extension.py"
+REPO_ROOT_PREFIX = str(REPO_ROOT) + os.sep
 OUT_DIR = REPO_ROOT / "extension_unpacked_test"
 
+sys.path.insert(0, str(REPO_ROOT / "scripts"))
+from build_extension import BuildError, build  # noqa: E402
+# crude extract of src/href attributes
+ATTR_RE = re.compile(r"(?:src|href)\s*=\s*['\"]([^'\"]+)['\"]")
+
 def run_build():
     if OUT_DIR.exists():
         import shutil
         shutil.rmtree(OUT_DIR)
-    cmd = [sys.executable, str(SCRIPT), "--output", str(OUT_DIR), "--mode", "minimal"]
-    subprocess.run(cmd, check=True)
+    # Build in-process instead of spawning a new interpreter.
+    try:
+        build(OUT_DIR.resolve(), "minimal")
+    except BuildError as e:
+        raise AssertionError(f"Build failed: {e}") from e
 
 def parse_asset_refs(html_path: Path) -> set[str]:
     if not html_path.exists():
         return set()
     text = html_path.read_text(encoding="utf-8", errors="ignore")
     refs = set()
-    # crude extract of src/href attributes
-    import re
-    for m in re.finditer(r"(?:src|href)\s*=\s*['\"]([^'\"]+)['\"]", text):
+    for m in ATTR_RE.finditer(text):
         raw = m.group(1)
         if "://" in raw or raw.startswith("data:"):
             continue
         # normalize relative path from HTML parent
-        candidate = (html_path.parent / raw).resolve()
-        if str(candidate).startswith(str(REPO_ROOT)):
-            rel = candidate.relative_to(REPO_ROOT)
-            refs.add(str(rel))
+        candidate = str((html_path.parent / raw).resolve())
+        if candidate.startswith(REPO_ROOT_PREFIX):
+            refs.add(candidate[len(REPO_ROOT_PREFIX):])
     return refs
 
 def assert_side_panel_assets():
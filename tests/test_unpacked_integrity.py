@@ -6,8 +6,7 @@ UNPACKED = REPO_ROOT / "extension_unpacked"
 
 
 def load_manifest(path: Path):
-    with path.open("r", encoding="utf-8") as f:
-        return json.load(f)
+    return json.loads(path.read_bytes())
 
 
 def test_manifest_web_accessible_patterns():